@@ -5,86 +5,200 @@ A UTF‑8–based mixed‑radix tokenizer that converts Unicode text into a list
 using the mixed‑radix encoding of UTF‑8, and can reverse the process to recover the text.
 """
 
+from __future__ import annotations
+
+import codecs
+import sys
+from array import array
+
+# Native-order UTF‑32, whose code units line up with a C unsigned int.
+_UTF32 = 'utf-32-le' if sys.byteorder == 'little' else 'utf-32-be'
+# Resolved once so each call reaches the C codec without a codec registry lookup.
+_utf32_encode = codecs.getencoder(_UTF32)
+_utf32_decode = codecs.getdecoder(_UTF32)
+
+# Shortest text worth a speculative Latin‑1 encode in tokenize(); below this a failed
+# attempt's exception costs more than the UTF‑32 path it would save.
+_LATIN1_PROBE_MIN_LEN = 1024
+
+# Every token fits in 21 bits (max 0x10FFFF), so three of them pack into one 64-bit word.
+_TOKEN_BITS = 21
+_TOKEN_MASK = (1 << _TOKEN_BITS) - 1
+# All-ones 21-bit value pads the last word; it is above 0x10FFFF, so never a real token.
+_PAD_TOKEN = _TOKEN_MASK
+
+
+def _token_buffer(tokens) -> memoryview | None:
+    """
+    Returns a zero-copy view of tokens that are already stored as native 32-bit ints (an
+    ``array('i')``, a NumPy int32/uint32 array, ...), or None if they must be converted.
+    """
+    if isinstance(tokens, list):
+        return None
+    try:
+        view = memoryview(tokens)
+    except TypeError:
+        return None
+    if view.ndim == 1 and view.format in ('i', 'I') and view.c_contiguous:
+        return view
+    return None
+
+
 class UTF8MixedRadixTokenizer:
     def __init__(self):
         # You can add initialization parameters if needed.
         pass
 
-    def tokenize(self, text: str) -> list[int]:
+    def tokenize(self, text: str, as_list: bool = True) -> list[int] | array:
         """
         Tokenizes a Unicode string into a list of integers using its UTF‑8 mixed‑radix representation.
         Each Unicode character is encoded in UTF‑8 and its data bits are extracted and combined into an integer.
+        Concatenating the data bits of a UTF‑8 sequence yields exactly the code point it encodes, so the
+        tokens are the text's code points.
 
         Args:
             text (str): The input Unicode string.
+            as_list (bool): If False, return the tokens as an ``array('i')`` of 32-bit ints
+                (4 bytes per token, buffer-protocol compatible) instead of a list.
 
         Returns:
-            List[int]: A list of integers representing each token.
+            List[int]: A list of integers representing each token (an ``array('i')`` if as_list is False).
         """
-        tokens = []
-        for char in text:
-            encoded = char.encode('utf-8')
-            if len(encoded) == 1:
-                # 1-byte encoding: 0xxx xxxx → 7 data bits
-                token = encoded[0] & 0x7F  # mask off the header (0x7F == 0b01111111)
-            elif len(encoded) == 2:
-                # 2-byte encoding: 110xxxxx, 10xxxxxx → 5 bits and 6 bits → 11 bits total
-                token = ((encoded[0] & 0x1F) << 6) | (encoded[1] & 0x3F)
-            elif len(encoded) == 3:
-                # 3-byte encoding: 1110xxxx, 10xxxxxx, 10xxxxxx → 4 + 6 + 6 = 16 bits
-                token = ((encoded[0] & 0x0F) << 12) | ((encoded[1] & 0x3F) << 6) | (encoded[2] & 0x3F)
-            elif len(encoded) == 4:
-                # 4-byte encoding: 11110xxx, 10xxxxxx, 10xxxxxx, 10xxxxxx → 3 + 6 + 6 + 6 = 21 bits
-                token = ((encoded[0] & 0x07) << 18) | ((encoded[1] & 0x3F) << 12) | ((encoded[2] & 0x3F) << 6) | (encoded[3] & 0x3F)
-            else:
-                raise ValueError(f"Unexpected UTF‑8 byte length {len(encoded)} for character {char!r}")
-            tokens.append(token)
-        return tokens
+        if not as_list:
+            # Copy the encoder's native-order buffer straight into an int32 array.
+            tokens = array('i')
+            tokens.frombytes(_utf32_encode(text, 'strict')[0])
+            return tokens
+        if text.isascii():
+            # O(1) check in CPython: every token is a single byte, so skip the 4-byte widening.
+            return list(text.encode('ascii'))
+        if len(text) >= _LATIN1_PROBE_MIN_LEN and text[0] <= '\xff' and text[-1] <= '\xff':
+            # Both ends are Latin‑1, as in most Western European text: try the 1-byte encoder.
+            # This is only a guess; a wider character in between costs a failed Latin‑1 encode
+            # before the UTF‑32 path below.
+            try:
+                return list(text.encode('latin-1'))
+            except UnicodeEncodeError:
+                pass
+        # Since token == code point, the token stream is the text's UTF‑32 form: let the
+        # C codec produce it in one call and reinterpret the buffer as 32-bit ints.
+        return memoryview(_utf32_encode(text, 'strict')[0]).cast('I').tolist()
+
+    def tokenize_batch(self, texts: list[str], as_list: bool = True) -> list[list[int]] | list[array]:
+        """
+        Tokenizes many strings at once. Equivalent to calling tokenize() on each string, but the
+        whole batch goes through the encoder in one call, which amortises the per-call overhead
+        that dominates on short strings.
+
+        Args:
+            texts (List[str]): The input Unicode strings.
+            as_list (bool): If False, return each string's tokens as an ``array('i')``.
+
+        Returns:
+            List[List[int]]: The tokens of each input string, in order.
+        """
+        # The batch is walked twice (join, then slicing), so a one-shot iterable must be kept.
+        texts = list(texts)
+        encoded = _utf32_encode(''.join(texts), 'strict')[0]
+        if as_list:
+            flat = memoryview(encoded).cast('I').tolist()
+        else:
+            flat = array('i')
+            flat.frombytes(encoded)
+        # len() of a str is its code point count, i.e. its number of tokens.
+        batch = []
+        start = 0
+        for text in texts:
+            end = start + len(text)
+            batch.append(flat[start:end])
+            start = end
+        return batch
 
     def detokenize(self, tokens: list[int]) -> str:
         """
-        Converts a list of mixed‑radix token integers back to a Unicode string by reconstructing
-        the original UTF‑8 byte sequences and decoding them.
+        Converts a list of mixed‑radix token integers back to a Unicode string. Each token is the
+        code point of the character its UTF‑8 byte sequence encodes.
 
         Args:
-            tokens (List[int]): A list of token integers.
+            tokens (List[int]): A list of token integers, or a 1-D buffer of native 32-bit ints
+                (``array('i')``, a NumPy int32/uint32 array) which is decoded without copying.
 
         Returns:
             str: The reconstructed Unicode string.
         """
-        chars = []
-        for token in tokens:
-            if token < 0x80:
-                # 1-byte token (0 to 127)
-                b = bytes([token])
-            elif token < 0x800:
-                # 2-byte token (0x80 to 0x7FF)
-                b = bytes([
-                    0xC0 | (token >> 6),          # 110xxxxx
-                    0x80 | (token & 0x3F)           # 10xxxxxx
-                ])
-            elif token < 0x10000:
-                # 3-byte token (0x800 to 0xFFFF)
-                b = bytes([
-                    0xE0 | (token >> 12),                      # 1110xxxx
-                    0x80 | ((token >> 6) & 0x3F),                # 10xxxxxx
-                    0x80 | (token & 0x3F)                        # 10xxxxxx
-                ])
-            elif token < 0x110000:
-                # 4-byte token (0x10000 to 0x10FFFF)
-                b = bytes([
-                    0xF0 | (token >> 18),                          # 11110xxx
-                    0x80 | ((token >> 12) & 0x3F),                   # 10xxxxxx
-                    0x80 | ((token >> 6) & 0x3F),                    # 10xxxxxx
-                    0x80 | (token & 0x3F)                            # 10xxxxxx
-                ])
-            else:
-                raise ValueError(f"Token {token} is out of Unicode range")
+        if isinstance(tokens, (bytes, bytearray)):
+            # Each byte is already a code point (U+0000 to U+00FF). array('I', ...) would instead
+            # reinterpret the raw bytes as 4-byte machine words.
+            return tokens.decode('latin-1')
+        # Tokens are code points (see tokenize), so pack them as 32-bit ints and let the C
+        # UTF‑32 codec rebuild the string in a single pass, validating as it goes.
+        buf = _token_buffer(tokens)
+        if buf is None:
             try:
-                chars.append(b.decode('utf-8'))
-            except UnicodeDecodeError as e:
-                raise ValueError(f"Failed to decode bytes {b} from token {token}: {e}") from e
-        return ''.join(chars)
+                buf = array('I', tokens)
+            except OverflowError as e:
+                # Only reached on bad input, so rescanning for the culprit costs the fast path nothing.
+                # A one-shot iterator (generator, map, ...) has already been consumed past it, though.
+                token = next((t for t in tokens if not 0 <= t < 0x110000), None)
+                if token is None:
+                    raise ValueError(f"Token out of Unicode range: {e}") from e
+                raise ValueError(f"Token {token} is out of Unicode range") from e
+        try:
+            # Decode straight from the array's buffer, without an intermediate bytes copy.
+            return _utf32_decode(buf, 'strict')[0]
+        except UnicodeDecodeError as e:
+            token = buf[e.start // 4]
+            if not 0 <= token < 0x110000:
+                raise ValueError(f"Token {token} is out of Unicode range") from e
+            raise ValueError(f"Token {token} is not a valid code point: {e.reason}") from e
+
+    def pack(self, tokens: list[int]) -> array:
+        """
+        Packs tokens three to a 64-bit word as 21-bit fields (``a | b << 21 | c << 42``), about
+        2.67 bytes per token against 4 for an int32 token array (a one-third saving), for storage
+        or streaming.
+
+        Args:
+            tokens (List[int]): A list (or ``array('i')``) of token integers.
+
+        Returns:
+            array: An ``array('Q')`` of packed words. If the token count is not a multiple of three,
+                the unused fields of the last word hold the pad value 0x1FFFFF, which is above
+                U+10FFFF and so never a real token. unpack() strips padding only from the end,
+                so the output of several pack() calls must not be concatenated: padding from
+                the earlier calls would come back as tokens. Pack the joined tokens instead.
+        """
+        tokens = list(tokens)
+        if tokens and not (min(tokens) >= 0 and max(tokens) < 0x110000):
+            token = next(t for t in tokens if not 0 <= t < 0x110000)
+            raise ValueError(f"Token {token} is out of Unicode range")
+        tokens += [_PAD_TOKEN] * (-len(tokens) % 3)
+        return array('Q', [
+            a | (b << _TOKEN_BITS) | (c << (2 * _TOKEN_BITS))
+            for a, b, c in zip(tokens[0::3], tokens[1::3], tokens[2::3])
+        ])
+
+    def unpack(self, packed: array) -> list[int]:
+        """
+        Reverses pack(), recovering the original tokens from 64-bit words.
+
+        Args:
+            packed (array): Words produced by a single pack() call.
+
+        Returns:
+            List[int]: The unpacked tokens, with padding removed.
+        """
+        tokens = []
+        extend = tokens.extend
+        for word in packed:
+            extend((
+                word & _TOKEN_MASK,                            # bits 0-20
+                (word >> _TOKEN_BITS) & _TOKEN_MASK,           # bits 21-41
+                (word >> (2 * _TOKEN_BITS)) & _TOKEN_MASK      # bits 42-62
+            ))
+        while tokens and tokens[-1] == _PAD_TOKEN:
+            tokens.pop()
+        return tokens
 
 
 # If run as a script, perform a simple test.
@@ -99,3 +213,64 @@ if __name__ == '__main__':
 
     recovered_text = tokenizer.detokenize(tokens)
     print("Recovered text:", recovered_text)
+
+    # as_list=False returns the same tokens as a compact int32 array.
+    token_array = tokenizer.tokenize(sample_text, as_list=False)
+    if list(token_array) != tokens:
+        raise AssertionError(f"tokenize(as_list=False) returned {token_array!r}, expected {tokens}")
+    if tokenizer.detokenize(token_array) != sample_text:
+        raise AssertionError("detokenize(tokenize(as_list=False)) did not recover the sample text")
+    print("Array tokens OK:", token_array)
+
+    # A bytes object is a valid token sequence: every byte is its own code point.
+    for byte_tokens, expected in ((b'A\x00\x00\x00', 'A\x00\x00\x00'), (bytearray(b'hiya'), 'hiya'),
+                                  (b'hello', 'hello'), ('café'.encode('latin-1'), 'café')):
+        if tokenizer.detokenize(byte_tokens) != expected:
+            raise AssertionError(f"detokenize({byte_tokens!r}) did not treat each byte as a token")
+    print("Byte-string tokens OK")
+
+    # tokenize_batch() must match per-string tokenize(), for lists and one-shot iterables alike.
+    batch_texts = [sample_text, "", "\U0001F600\U00010348", "", "plain"]
+    expected_batch = [tokenizer.tokenize(text) for text in batch_texts]
+    for batch_input in (batch_texts, (text for text in batch_texts)):
+        if tokenizer.tokenize_batch(batch_input) != expected_batch:
+            raise AssertionError(f"tokenize_batch({batch_input!r}) differs from per-string tokenize()")
+    if [list(t) for t in tokenizer.tokenize_batch(batch_texts, as_list=False)] != expected_batch:
+        raise AssertionError("tokenize_batch(as_list=False) differs from per-string tokenize()")
+    print("Batch tokenization OK")
+
+    # pack()/unpack() round trip, covering no padding (0, 3 tokens) and 1-2 padded fields.
+    # Taken from the end of the sample so the widest token (the emoji) is included.
+    for length in (0, 1, 2, 3):
+        part = tokens[len(tokens) - length:]
+        packed = tokenizer.pack(part)
+        if len(packed) != (length + 2) // 3:
+            raise AssertionError(f"pack({part}) produced {len(packed)} words")
+        if tokenizer.unpack(packed) != part:
+            raise AssertionError(f"unpack(pack({part})) != {part}")
+        if tokenizer.detokenize(tokenizer.unpack(packed)) != sample_text[len(sample_text) - length:]:
+            raise AssertionError(f"detokenize(unpack(pack({part}))) does not match the sample text")
+    print("Packed round trip OK for lengths 0-3")
+
+    # Native int32 buffers take the zero-copy path and must report errors like a list does.
+    if tokenizer.detokenize(array('i', tokens)) != sample_text:
+        raise AssertionError("detokenize(array('i')) did not recover the sample text")
+    for bad_token in (-1, 0x110000, 0xD800):
+        errors = []
+        for container in (list, lambda t: array('i', t)):
+            try:
+                tokenizer.detokenize(container([65, bad_token]))
+            except ValueError as e:
+                errors.append(str(e))
+        if len(errors) != 2 or errors[0] != errors[1]:
+            raise AssertionError(f"Token {bad_token} reported inconsistently: {errors}")
+        print("Rejected invalid token:", errors[0])
+
+    # Out-of-range tokens must raise ValueError, including from one-shot iterators.
+    for bad_tokens in ([65, -1, 66], (t for t in [65, -1, 66]), iter([65, 2**33])):
+        try:
+            tokenizer.detokenize(bad_tokens)
+        except ValueError as e:
+            print("Rejected out-of-range token:", e)
+        else:
+            raise AssertionError(f"detokenize accepted out-of-range tokens from {bad_tokens!r}")